@@ -1,17 +1,41 @@
-import json
+import mmap
+import os
 import re
+import sys
 from collections import defaultdict, Counter
 from math import log
 
+import orjson
+
+try:
+    import numpy as np
+except ImportError:     # NumPy absent : probabilités calculées en Python pur
+    np = None
+
+try:
+    from numba import njit, types
+    from numba.typed import Dict, List
+except ImportError:     # Numba absent : comptage en Python pur
+    njit = None
+
 # ======== (1) Nettoyage du texte ========
 
+# Regexes compilées une fois ; tout le balisage est supprimé en un seul passage.
+# Un balisage qui en chevauche un autre est retiré selon celui qui commence le plus
+# à gauche, et non plus balises, puis templates, puis liens en passes successives :
+# le texte nettoyé peut alors différer de l'ancien (ex. "{{… <…}} …>")
+MARKUP_RE = re.compile(
+    r"<[^>]+>"                      # Balises HTML
+    r"|\{\{(?s:.*?)\}\}"            # Templates wiki
+    r"|\[\[.*?\]\]"                 # Liens internes
+    r"|\[https?:\/\/[^\]]*\]"       # Liens externes
+)
+# Toute suite de caractères hors alphabet (espaces compris) devient un seul espace
+SEPARATOR_RE = re.compile(r"[^0-9A-Za-z\u0600-\u06FF\u2D30-\u2D7F’'ʿ_\-]+")
+
 def clean_text(text):
-    text = re.sub(r"<[^>]+>", " ", text)           # Balises HTML
-    text = re.sub(r"\{\{.*?\}\}", " ", text, flags=re.DOTALL)   # Templates wiki
-    text = re.sub(r"\[\[.*?\]\]", " ", text)       # Liens internes
-    text = re.sub(r"\[https?:\/\/[^\]]*\]", " ", text)  # Liens externes
-    text = re.sub(r"[^0-9A-Za-z\u0600-\u06FF\u2D30-\u2D7F’'ʿ_\-\s]", " ", text)
-    text = re.sub(r"\s+", " ", text).strip()
+    text = MARKUP_RE.sub(" ", text)
+    text = SEPARATOR_RE.sub(" ", text).strip()
     return text
 
 # ======== (2) Tokenisation ========
@@ -24,22 +48,83 @@ def tokenize(text):
 # ======== (3) Construction des N-grammes ========
 
 def build_ngrams(tokens, n):
-    ngrams = []
-    for i in range(len(tokens) - n + 1):
-        ngrams.append(tuple(tokens[i:i + n]))
-    return ngrams
+    # Itérateur paresseux : zip sur des vues décalées, sans liste intermédiaire
+    return zip(*(tokens[i:] for i in range(n)))
+
+if njit is not None:
+    @njit(cache=True)
+    def _count_ngram_ids(ids, max_n, base):
+        # Un seul passage sur les identifiants : à chaque position, la clé
+        # entière (base = taille du vocabulaire) est prolongée de 1 à max_n
+        tables = List()
+        for _ in range(max_n):
+            tables.append(Dict.empty(key_type=types.int64, value_type=types.int64))
+
+        for i in range(len(ids)):
+            key = 0
+            for j in range(min(max_n, len(ids) - i)):
+                key = key * base + ids[i + j]
+                table = tables[j]
+                table[key] = table.get(key, 0) + 1
+
+        # Résultat en tableaux plats (ordre n dans offsets[n-1]:offsets[n]) : renvoyer
+        # une List typée imposerait une compilation non mise en cache à son parcours
+        total = 0
+        for table in tables:
+            total += len(table)
+        keys = np.empty(total, dtype=np.int64)
+        values = np.empty(total, dtype=np.int64)
+        offsets = np.zeros(max_n + 1, dtype=np.int64)
+        k = 0
+        for n in range(max_n):
+            for key, count in tables[n].items():
+                keys[k] = key
+                values[k] = count
+                k += 1
+            offsets[n + 1] = k
+        return keys, values, offsets
+
+def count_ngram_ids(ids, words, max_order=5):
+    base = len(words)
+
+    # Ordres jusqu'à max_order dont la clé entière tient sur 64 bits
+    max_n = 0
+    while max_n < max_order and base ** (max_n + 1) < 2 ** 63:
+        max_n += 1
+    all_keys, all_values, offsets = _count_ngram_ids(ids, max_n, base)
+
+    counts = {}
+    for n in range(1, max_n + 1):
+        keys = all_keys[offsets[n - 1]:offsets[n]]
+        values = all_values[offsets[n - 1]:offsets[n]]
+        # Décodage des clés entières en tuples de mots
+        columns = []
+        for _ in range(n):
+            columns.append(words[keys % base])
+            keys = keys // base
+        columns.reverse()
+        counts[n] = dict(zip(zip(*columns), values.tolist()))
+
+    return counts
 
 # ======== (4) Calcul des probabilités ========
 
 def calculate_probabilities(ngram_counts, lower_counts):
-    probabilities = {}
-
     vocab_size = len(lower_counts)
 
-    for ngram, count in ngram_counts.items():
-        prefix = ngram[:-1]
+    if np is not None:
+        # Calcul vectorisé : compteurs et compteurs de préfixe en tableaux parallèles
+        ngrams = list(ngram_counts)
+        counts = np.fromiter(ngram_counts.values(), dtype=np.int64, count=len(ngrams))
+        prefix_counts = np.fromiter((lower_counts.get(ngram[:-1], 0) for ngram in ngrams),
+                                    dtype=np.int64, count=len(ngrams))
+        log_probs = -np.log((counts + 1) / (prefix_counts + vocab_size))   # log-proba (plus stable)
+        return dict(zip(ngrams, log_probs.tolist()))
+
+    probabilities = {}
 
-        prefix_count = lower_counts[prefix] if prefix in lower_counts else 0
+    for ngram, count in ngram_counts.items():
+        prefix_count = lower_counts.get(ngram[:-1], 0)
 
         prob = (count + 1) / (prefix_count + vocab_size)
 
@@ -47,43 +132,78 @@ def calculate_probabilities(ngram_counts, lower_counts):
 
     return probabilities
 
-# ======== (5) Pipeline complet ========
+# ======== (5) Sauvegarde JSON ========
+
+# Tampon d'écriture de 1 Mio : quelques gros appels write() au lieu de milliers de 8 Kio
+WRITE_BUFFER_SIZE = 1 << 20
+
+def dump_ngrams(ngrams, path):
+    # Écriture en flux : les clés sont jointes à la volée, sans dictionnaire intermédiaire
+    with open(path, "wb", buffering=WRITE_BUFFER_SIZE) as f:
+        f.write(b"{")
+        sep = b""
+        for ngram, value in ngrams.items():
+            f.write(sep + orjson.dumps(" ".join(ngram)) + b":" + orjson.dumps(value))
+            sep = b","
+        f.write(b"}")
+
+# ======== (6) Pipeline complet ========
+
+def read_tokens(input_file):
+    # Corpus lu en mémoire mappée, ligne par ligne (une page par ligne, cf. exctract) :
+    # pas de copie intégrale du texte brut, nettoyé puis en minuscules.
+    # Le balisage n'est apparié qu'au sein d'une ligne : un "{{" ou "<" orphelin
+    # ne supprime plus le texte des pages suivantes jusqu'au "}}" ou ">" suivant
+    tokens = []
+
+    with open(input_file, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:     # mmap refuse les fichiers vides
+            return tokens
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for line in iter(mm.readline, b""):
+                text = clean_text(line.decode("utf-8"))
+                # Sans Numba, tokens internés : un seul objet str par mot, les tuples
+                # de n-grammes se hachent et se comparent alors par identité
+                words = tokenize(text)
+                tokens.extend(words if njit is not None else map(sys.intern, words))
 
-def process_corpus(input_file, output_prefix):
-    with open(input_file, "r", encoding="utf-8") as f:
-        text = f.read()
+    return tokens
 
-    text = clean_text(text)
-    tokens = tokenize(text)
+def process_corpus(input_file, output_prefix):
+    tokens = read_tokens(input_file)
 
     print("Total tokens:", len(tokens))
 
+    # Encodage des tokens en identifiants entiers pour le noyau Numba
+    ids = None
+    if njit is not None and tokens:
+        vocab = {w: i for i, w in enumerate(dict.fromkeys(tokens))}
+        words = np.array(list(vocab), dtype=object)
+        ids = np.fromiter((vocab[t] for t in tokens), dtype=np.int32, count=len(tokens))
+
     # Count 1→5 grams
-    counts = {n: Counter() for n in range(1, 6)}
+    counts = {}
 
-    for n in range(1, 6):
-        grams = build_ngrams(tokens, n)
-        counts[n].update(grams)
+    if ids is not None:
+        # La clé entière doit tenir sur 64 bits : ordres au-delà comptés par Counter
+        counts = count_ngram_ids(ids, words)
+
+    for n in range(len(counts) + 1, 6):
+        counts[n] = Counter(build_ngrams(tokens, n))
 
     # Probabilités
     probabilities = {}
 
     for n in range(2, 6):
-        probabilities[n] = calculate_probabilities(
-            counts[n],
-            {k: v for k, v in counts[n - 1].items()}
-        )
+        probabilities[n] = calculate_probabilities(counts[n], counts[n - 1])
 
     # Sauvegarde JSON
     for n in range(1, 6):
-        out_path = f"{output_prefix}_{n}gram_counts.json"
-        json.dump({" ".join(k): v for k, v in counts[n].items()},
-                  open(out_path, "w", encoding="utf-8"), ensure_ascii=False)
+        dump_ngrams(counts[n], f"{output_prefix}_{n}gram_counts.json")
 
     for n in range(2, 6):
-        out_path = f"{output_prefix}_{n}gram_logproba.json"
-        json.dump({" ".join(k): v for k, v in probabilities[n].items()},
-                  open(out_path, "w", encoding="utf-8"), ensure_ascii=False)
+        dump_ngrams(probabilities[n], f"{output_prefix}_{n}gram_logproba.json")
 
     print(" Terminé – fichiers générés :")
     print("    - counts 1→5-gram")
@@ -92,4 +212,5 @@ def process_corpus(input_file, output_prefix):
 
 # ======== EXECUTION ========
 
-process_corpus("kabyle_corpus.txt", "kabyle")
+if __name__ == "__main__":
+    process_corpus("kabyle_corpus.txt", "kabyle")
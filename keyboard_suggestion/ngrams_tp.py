@@ -1,36 +1,44 @@
 # Construire les n-grammes et calculer les probabilités
-import json
 import os
+import pickle
 import re
-from collections import defaultdict
-from nltk import FreqDist
-from nltk.util import bigrams, trigrams, ngrams
-import nltk
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
+import orjson
 
-# Download required NLTK data
 try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    try:
-        nltk.download('punkt', quiet=True)
-    except:
-        pass
+    import numpy as np
+except ImportError:
+    # NumPy is optional; probabilities are computed in pure Python without it
+    np = None
+
+try:
+    from numba import njit, types
+    from numba.typed import Dict, List
+except ImportError:
+    # Numba is optional; n-grams are counted with Counter without it
+    njit = None
+
+try:
+    import msgpack
+except ImportError:
+    # msgpack is optional; only needed for fmt='msgpack'
+    msgpack = None
+
+# Sequences of word characters, or single punctuation characters
+TOKEN_RE = re.compile(r'\w+|[^\w\s]')
 
 def simple_tokenize(text):
     """Simple tokenization that splits on whitespace and punctuation.
     Works for English, French, and Arabic text.
     """
-    # Convert to lowercase
-    text = text.lower()
-    # Split on whitespace first
-    words = text.split()
-    tokens = []
-    for word in words:
-        # Split word and punctuation, but keep both
-        # This regex finds sequences of word characters and sequences of non-word characters
-        parts = re.findall(r'\w+|[^\w\s]', word)
-        tokens.extend(parts)
-    return [t for t in tokens if t.strip()]
+    # Whitespace is never matched, so no separate split/strip is needed
+    return TOKEN_RE.findall(text.lower())
+
+# Output formats supported by process_language
+OUTPUT_FORMATS = ('pickle', 'msgpack', 'json')
 
 # File paths for the three sentence files
 FILE_PATHS = {
@@ -60,65 +68,196 @@ def read_sentences_file(file_path):
 
 def process_text_to_tokens(sentences):
     """Convert sentences to tokens."""
-    tokens = []
-    for sentence in sentences:
-        try:
-            # Use simple tokenization instead of NLTK's word_tokenize
-            sentence_tokens = simple_tokenize(sentence)
-            tokens.extend(sentence_tokens)
-        except Exception as e:
-            print(f"Error tokenizing sentence: {e}")
-            continue
-    return tokens
+    # Tokenize all sentences in one regex pass over the joined text
+    return simple_tokenize('\n'.join(sentences))
 
 def calculate_probabilities(ngram_freq, prev_ngram_freq):
-    """Calculate conditional probabilities for n-grams.
-    For n-gram (w1, w2, ..., wn), calculates P(wn | w1, w2, ..., wn-1)
+    """Calculate conditional probabilities for n-grams (n >= 2).
+    For n-gram (w1, w2, ..., wn), calculates P(wn | w1, w2, ..., wn-1).
+    Unigram probabilities are computed separately in process_language.
     """
+    if np is not None:
+        # Vectorized path: parallel arrays of counts and previous n-gram counts
+        ngrams = list(ngram_freq)
+        counts = np.fromiter(ngram_freq.values(), dtype=np.int64, count=len(ngrams))
+        prev_counts = np.fromiter((prev_ngram_freq.get(ngram[:-1], 0) for ngram in ngrams),
+                                  dtype=np.int64, count=len(ngrams))
+        probs = np.divide(counts, prev_counts, out=np.zeros(len(ngrams)), where=prev_counts > 0)
+        return dict(zip(ngrams, probs.tolist()))
+    
     probs = {}
     for ngram, count in ngram_freq.items():
-        if len(ngram) > 1:
-            # Get the previous n-gram (all but the last word)
-            prev_ngram = ngram[:-1]
-            # Get count of previous n-gram
-            prev_count = prev_ngram_freq.get(prev_ngram, 0)
-            if prev_count > 0:
-                probs[ngram] = count / prev_count
-            else:
-                probs[ngram] = 0.0
-        else:
-            # For unigrams, probability is just frequency (handled separately)
-            total = sum(ngram_freq.values())
-            if total > 0:
-                probs[ngram] = count / total
-            else:
-                probs[ngram] = 0.0
+        # Count of the previous n-gram (all but the last word)
+        prev_count = prev_ngram_freq.get(ngram[:-1], 0)
+        probs[ngram] = count / prev_count if prev_count else 0.0
     return probs
 
+if njit is not None:
+    @njit(cache=True)
+    def _count_ngram_ids(ids, max_n, base):
+        """Count 1- to max_n-grams of token ids in a single sweep.
+        Each n-gram is encoded as a base-`base` integer, extended one token
+        at a time from every start position.
+        """
+        tables = List()
+        for _ in range(max_n):
+            tables.append(Dict.empty(key_type=types.int64, value_type=types.int64))
+
+        for i in range(len(ids)):
+            key = 0
+            for j in range(min(max_n, len(ids) - i)):
+                key = key * base + ids[i + j]
+                table = tables[j]
+                table[key] = table.get(key, 0) + 1
+
+        # Flat arrays, order n in offsets[n-1]:offsets[n]; returning a typed List
+        # would trigger an uncached compilation when it is iterated from Python
+        total = 0
+        for table in tables:
+            total += len(table)
+        keys = np.empty(total, dtype=np.int64)
+        values = np.empty(total, dtype=np.int64)
+        offsets = np.zeros(max_n + 1, dtype=np.int64)
+        k = 0
+        for n in range(max_n):
+            for key, count in tables[n].items():
+                keys[k] = key
+                values[k] = count
+                k += 1
+            offsets[n + 1] = k
+        return keys, values, offsets
+
+def count_ngram_ids(ids, words, max_order=5):
+    """Count n-grams of token ids with the Numba kernel.
+    Only the orders up to max_order whose encoded key fits in 64 bits are
+    counted; returns {n: {word tuple: count}} for those orders.
+    """
+    base = len(words)
+    max_n = 0
+    while max_n < max_order and base ** (max_n + 1) < 2 ** 63:
+        max_n += 1
+    all_keys, all_values, offsets = _count_ngram_ids(ids, max_n, base)
+
+    counts = {}
+    for n in range(1, max_n + 1):
+        keys = all_keys[offsets[n - 1]:offsets[n]]
+        values = all_values[offsets[n - 1]:offsets[n]]
+        # Decode integer keys back into tuples of words
+        columns = []
+        for _ in range(n):
+            columns.append(words[keys % base])
+            keys = keys // base
+        columns.reverse()
+        counts[n] = dict(zip(zip(*columns), values.tolist()))
+    return counts
+
+def count_ngrams(tokens, ids=None, words=None):
+    """Count unigrams to pentagrams of tokens, keyed by n.
+    Unigrams are keyed by word, higher orders by word tuple. Uses the Numba
+    kernel over integer token ids when available, for every order whose
+    encoded n-gram fits in 64 bits; the remaining orders fall back to
+    Counter over zipped, shifted token lists.
+    Every table is a plain dict whichever path counted it, so the pickled
+    outputs have the same type on every machine.
+    """
+    freqs = count_ngram_ids(ids, words) if ids is not None else {}
+    if 1 in freqs:
+        freqs[1] = {ngram[0]: count for ngram, count in freqs[1].items()}
+    else:
+        freqs[1] = dict(Counter(tokens))
+    for n in range(2, 6):
+        if n not in freqs:
+            freqs[n] = dict(Counter(zip(*(tokens[i:] for i in range(n)))))
+    return freqs
+
 def ngram_to_string(ngram):
     """Convert n-gram tuple to string for JSON serialization."""
     return ' '.join(ngram)
 
-def process_language(lang, file_path):
-    """Process a language file and generate all n-grams and probabilities."""
-    print(f"\nProcessing {lang}...")
+# Buffer size for streamed JSON files: a few large write() syscalls
+# instead of one per default 8 KiB buffer
+WRITE_BUFFER_SIZE = 1 << 20
+
+def write_json(obj, path):
+    """Write an object to a compact JSON file in one orjson call."""
+    with open(path, 'wb') as f:
+        f.write(orjson.dumps(obj))
+
+def dump_ngrams(ngram_dict, path):
+    """Stream a tuple-keyed n-gram dict to a JSON object file.
+    Keys are converted on the fly, so no string-keyed copy of the dict is built.
+    """
+    with open(path, 'wb', buffering=WRITE_BUFFER_SIZE) as f:
+        f.write(b'{')
+        sep = b''
+        for ngram, value in ngram_dict.items():
+            f.write(sep + orjson.dumps(ngram_to_string(ngram)) + b':' + orjson.dumps(value))
+            sep = b','
+        f.write(b'}')
+
+def save_output(obj, path, fmt, ngram_keys=False):
+    """Save an output object to `path` plus the extension of `fmt`.
+    Pickle stores the object as is, so n-gram keys stay tuples. Msgpack and
+    JSON map keys must be strings: tuple n-gram keys (ngram_keys=True) are
+    joined with ngram_to_string while streaming.
+    """
+    if fmt == 'pickle':
+        with open(f'{path}.pkl', 'wb') as f:
+            pickle.dump(obj, f, protocol=5)
+    elif fmt == 'msgpack':
+        with open(f'{path}.msgpack', 'wb', buffering=WRITE_BUFFER_SIZE) as f:
+            packer = msgpack.Packer(use_bin_type=True)
+            if ngram_keys:
+                f.write(packer.pack_map_header(len(obj)))
+                for ngram, value in obj.items():
+                    f.write(packer.pack(ngram_to_string(ngram)) + packer.pack(value))
+            else:
+                f.write(packer.pack(obj))
+    elif ngram_keys:
+        dump_ngrams(obj, f'{path}.json')
+    else:
+        write_json(obj, f'{path}.json')
+
+def check_output_format(fmt):
+    """Raise ValueError unless `fmt` is one of OUTPUT_FORMATS and usable here."""
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {fmt!r}, expected one of {OUTPUT_FORMATS}")
+    if fmt == 'msgpack' and msgpack is None:
+        raise ValueError("fmt='msgpack' requires the msgpack package")
+
+def process_language(lang, file_path, fmt='pickle'):
+    """Process a language file and generate all n-grams and probabilities.
+    Outputs are written as `fmt`: 'pickle' (default), 'msgpack' or 'json'.
+    """
+    check_output_format(fmt)
+    
+    print(f"\n[{lang}] Processing...")
     
     # Read sentences
     sentences = read_sentences_file(file_path)
     if not sentences:
-        print(f"No sentences found for {lang}")
+        print(f"[{lang}] No sentences found")
         return
     
-    print(f"Read {len(sentences)} sentences")
+    print(f"[{lang}] Read {len(sentences)} sentences")
     
     # Tokenize
     tokens = process_text_to_tokens(sentences)
-    print(f"Generated {len(tokens)} tokens")
+    if njit is None:
+        # Counter path: share one string object per distinct token so that
+        # n-gram tuples hash and compare by identity
+        tokens = list(map(sys.intern, tokens))
+    print(f"[{lang}] Generated {len(tokens)} tokens")
     
     # Create vocabulary
     vocab = sorted(set(tokens))
     vocab_dict = {word: idx for idx, word in enumerate(vocab)}
-    vocab_rev = {idx: word for idx, word in enumerate(vocab)}
+    
+    # Integer token ids for the Numba counting kernel
+    ids = words = None
+    if njit is not None and tokens:
+        words = np.array(vocab, dtype=object)
+        ids = np.fromiter((vocab_dict[t] for t in tokens), dtype=np.int32, count=len(tokens))
     
     # Create output directory
     output_dir = f'ngrams_tp/{lang}'
@@ -128,101 +267,111 @@ def process_language(lang, file_path):
     ngram_freqs = {}
     ngram_probs = {}
     
+    # Unigrams to pentagrams, counted together
+    print(f"[{lang}] Counting unigrams to pentagrams...")
+    freqs = count_ngrams(tokens, ids, words)
+    
     # Unigrams (1-grams)
-    print("Generating unigrams...")
-    unigrams = FreqDist(tokens)
-    ngram_freqs[1] = {ngram_to_string((word,)): count for word, count in unigrams.items()}
+    print(f"[{lang}] Generating unigrams...")
+    unigrams = freqs[1]
+    ngram_freqs[1] = unigrams
     total_unigrams = sum(unigrams.values())
     ngram_probs[1] = {ngram_to_string((word,)): count / total_unigrams if total_unigrams > 0 else 0.0 
                      for word, count in unigrams.items()}
     
-    # Bigrams (2-grams)
-    print("Generating bigrams...")
-    bigram_list = list(bigrams(tokens))
-    bigram_freq = FreqDist(bigram_list)
-    ngram_freqs[2] = {ngram_to_string(bigram): count for bigram, count in bigram_freq.items()}
-    # For bigrams, calculate P(w2|w1) = count(w1,w2) / count(w1)
-    bigram_probs = {}
-    for bigram, count in bigram_freq.items():
-        w1 = bigram[0]
-        w1_count = unigrams.get(w1, 0)
-        if w1_count > 0:
-            bigram_probs[bigram] = count / w1_count
-        else:
-            bigram_probs[bigram] = 0.0
-    ngram_probs[2] = {ngram_to_string(ngram): prob for ngram, prob in bigram_probs.items()}
-    
-    # Trigrams (3-grams)
-    print("Generating trigrams...")
-    trigram_list = list(trigrams(tokens))
-    trigram_freq = FreqDist(trigram_list)
-    ngram_freqs[3] = {ngram_to_string(trigram): count for trigram, count in trigram_freq.items()}
-    ngram_probs[3] = calculate_probabilities(trigram_freq, bigram_freq)
-    ngram_probs[3] = {ngram_to_string(ngram): prob for ngram, prob in ngram_probs[3].items()}
-    
-    # Quadrigrams (4-grams)
-    print("Generating quadrigrams...")
-    quadrigram_list = list(ngrams(tokens, 4))
-    quadrigram_freq = FreqDist(quadrigram_list)
-    ngram_freqs[4] = {ngram_to_string(quadrigram): count for quadrigram, count in quadrigram_freq.items()}
-    ngram_probs[4] = calculate_probabilities(quadrigram_freq, trigram_freq)
-    ngram_probs[4] = {ngram_to_string(ngram): prob for ngram, prob in ngram_probs[4].items()}
-    
-    # Pentagrams (5-grams)
-    print("Generating pentagrams...")
-    pentagram_list = list(ngrams(tokens, 5))
-    pentagram_freq = FreqDist(pentagram_list)
-    ngram_freqs[5] = {ngram_to_string(pentagram): count for pentagram, count in pentagram_freq.items()}
-    ngram_probs[5] = calculate_probabilities(pentagram_freq, quadrigram_freq)
-    ngram_probs[5] = {ngram_to_string(ngram): prob for ngram, prob in ngram_probs[5].items()}
-    
-    # Save all n-gram frequencies
-    print("Saving n-gram frequencies...")
-    for n in range(1, 6):
-        with open(f'{output_dir}/{n}gram.json', 'w', encoding='utf-8') as f:
-            json.dump(ngram_freqs[n], f, ensure_ascii=False, indent=2)
-    
-    # Save all probabilities
-    print("Saving probabilities...")
+    bigram_freq = freqs[2]
+    trigram_freq = freqs[3]
+    quadrigram_freq = freqs[4]
+    pentagram_freq = freqs[5]
     for n in range(2, 6):
-        with open(f'{output_dir}/prob_{n}gram.json', 'w', encoding='utf-8') as f:
-            json.dump(ngram_probs[n], f, ensure_ascii=False, indent=2)
-    
-    # Save vocabulary
-    print("Saving vocabulary...")
-    with open(f'{output_dir}/vocab.json', 'w', encoding='utf-8') as f:
-        json.dump(vocab_dict, f, ensure_ascii=False, indent=2)
-    
-    with open(f'{output_dir}/vocab_rev.json', 'w', encoding='utf-8') as f:
-        json.dump(vocab_rev, f, ensure_ascii=False, indent=2)
-    
-    # Save frequency summary
-    freq_summary = {
-        'unigrams': len(unigrams),
-        'bigrams': len(bigram_freq),
-        'trigrams': len(trigram_freq),
-        'quadrigrams': len(quadrigram_freq),
-        'pentagrams': len(pentagram_freq),
-        'total_tokens': len(tokens),
-        'vocabulary_size': len(vocab)
-    }
-    with open(f'{output_dir}/freq.json', 'w', encoding='utf-8') as f:
-        json.dump(freq_summary, f, ensure_ascii=False, indent=2)
-    
-    print(f"Completed processing {lang}")
-    print(f"  - Vocabulary size: {len(vocab)}")
-    print(f"  - Unigrams: {len(unigrams)}")
-    print(f"  - Bigrams: {len(bigram_freq)}")
-    print(f"  - Trigrams: {len(trigram_freq)}")
-    print(f"  - Quadrigrams: {len(quadrigram_freq)}")
-    print(f"  - Pentagrams: {len(pentagram_freq)}")
-
-# Process all three languages
+        ngram_freqs[n] = freqs[n]
+    
+    def save(obj, name, ngram_keys=False):
+        # Report each file once it is written, not when it is queued
+        save_output(obj, f'{output_dir}/{name}', fmt, ngram_keys)
+        print(f"[{lang}] Saved {name}")
+    
+    # Output files are written on a thread pool so that file IO overlaps
+    # with the probability computation below
+    with ThreadPoolExecutor(max_workers=4) as writer:
+        writes = []
+        
+        # Save all n-gram frequencies
+        # Unigrams are keyed by word, higher orders by tuple and streamed
+        writes.append(writer.submit(save, ngram_freqs[1], '1gram'))
+        for n in range(2, 6):
+            writes.append(writer.submit(save, ngram_freqs[n], f'{n}gram', ngram_keys=True))
+        
+        # Save vocabulary (word -> id). The reverse mapping is not written:
+        # consumers rebuild it as {idx: word for word, idx in vocab.items()}
+        writes.append(writer.submit(save, vocab_dict, 'vocab'))
+        
+        # Bigrams (2-grams)
+        print(f"[{lang}] Generating bigrams...")
+        # For bigrams, calculate P(w2|w1) = count(w1,w2) / count(w1)
+        # (w1 always occurs as a unigram, so its count is never zero)
+        ngram_probs[2] = {bigram: count / unigrams[bigram[0]]
+                          for bigram, count in bigram_freq.items()}
+        
+        # Trigrams (3-grams)
+        print(f"[{lang}] Generating trigrams...")
+        ngram_probs[3] = calculate_probabilities(trigram_freq, bigram_freq)
+        
+        # Quadrigrams (4-grams)
+        print(f"[{lang}] Generating quadrigrams...")
+        ngram_probs[4] = calculate_probabilities(quadrigram_freq, trigram_freq)
+        
+        # Pentagrams (5-grams)
+        print(f"[{lang}] Generating pentagrams...")
+        ngram_probs[5] = calculate_probabilities(pentagram_freq, quadrigram_freq)
+        
+        # Save all probabilities
+        for n in range(2, 6):
+            writes.append(writer.submit(save, ngram_probs[n], f'prob_{n}gram', ngram_keys=True))
+        
+        # Save frequency summary
+        freq_summary = {
+            'unigrams': len(unigrams),
+            'bigrams': len(bigram_freq),
+            'trigrams': len(trigram_freq),
+            'quadrigrams': len(quadrigram_freq),
+            'pentagrams': len(pentagram_freq),
+            'total_tokens': len(tokens),
+            'vocabulary_size': len(vocab)
+        }
+        writes.append(writer.submit(save, freq_summary, 'freq'))
+        
+        # Surface any error raised while writing
+        for future in writes:
+            future.result()
+    
+    print(f"[{lang}] Completed processing")
+    print(f"[{lang}]   - Vocabulary size: {len(vocab)}")
+    print(f"[{lang}]   - Unigrams: {len(unigrams)}")
+    print(f"[{lang}]   - Bigrams: {len(bigram_freq)}")
+    print(f"[{lang}]   - Trigrams: {len(trigram_freq)}")
+    print(f"[{lang}]   - Quadrigrams: {len(quadrigram_freq)}")
+    print(f"[{lang}]   - Pentagrams: {len(pentagram_freq)}")
+
+def process_language_file(item, fmt='pickle'):
+    """Process one (lang, file_path) entry of FILE_PATHS in a worker process."""
+    lang, file_path = item
+    if os.path.exists(file_path):
+        process_language(lang, file_path, fmt)
+    else:
+        print(f"Warning: File not found: {file_path}")
+
+# Process all three languages, each in its own process
 if __name__ == '__main__':
-    for lang, file_path in FILE_PATHS.items():
-        if os.path.exists(file_path):
-            process_language(lang, file_path)
-        else:
-            print(f"Warning: File not found: {file_path}")
+    # Optional argument selects the output format, e.g. `python ngrams_tp.py json`
+    fmt = sys.argv[1] if len(sys.argv) > 1 else 'pickle'
+    # Reject a bad format up front, even when some input files are missing
+    try:
+        check_output_format(fmt)
+    except ValueError as e:
+        sys.exit(f"Error: {e}")
+    max_workers = min(len(FILE_PATHS), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(process_language_file, FILE_PATHS.items(), repeat(fmt)))
     
     print("\nAll processing complete!")